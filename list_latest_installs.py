@@ -8,10 +8,20 @@ Results are printed to stdout and stored in latest_installs.txt alongside this s
 from __future__ import annotations
 
 import argparse
+import ctypes
 import datetime
+import functools
+import itertools
+import os
+import queue
+import sqlite3
 import subprocess
 import sys
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
 
 
 ROOTS = [
@@ -20,71 +30,459 @@ ROOTS = [
     Path.home() / "Applications",
 ]
 OUTPUT_FILE = Path(__file__).with_name("latest_installs.txt")
+CACHE_FILE = OUTPUT_FILE.with_suffix(".cache.sqlite3")
+# Bump to invalidate cached dates, e.g. when a macOS release changes Spotlight semantics.
+CACHE_NONCE = 2
+MEMO_SIZE = 4096
 DEFAULT_LOOKBACK_DAYS = 14
+MAX_PROBE_WORKERS = 32
+WALK_WORKERS = 8
+PARALLEL_WALK_MIN_SUBDIRS = 4
+MDLS_BATCH_SIZE = 64
+MDLS_NULL_MARKER = "(null)"
+CORE_FOUNDATION_PATH = "/System/Library/Frameworks/CoreFoundation.framework/CoreFoundation"
+CORE_SERVICES_PATH = "/System/Library/Frameworks/CoreServices.framework/CoreServices"
+CF_ABSOLUTE_TIME_EPOCH = 978307200  # 2001-01-01T00:00:00Z as a POSIX timestamp.
+K_CF_STRING_ENCODING_UTF8 = 0x08000100
 
+# Timezones for the mdls "+HHMM" offset suffixes seen so far.
+_OFFSETS: dict[str, datetime.timezone] = {}
+# In-process dates keyed by (CACHE_NONCE, st_dev, st_ino, st_ctime_ns).
+_date_added_memo: dict[tuple[int, int, int, int], datetime.datetime] = {}
 
-def _iter_app_bundles(root: Path) -> list[Path]:
+
+def _scan_dir(directory: str) -> tuple[list[str], list[str]]:
+    """Split a directory's entries into (.app bundles, subdirectories to walk).
+
+    Unreadable directories and entries (e.g. a looping Foo.app symlink) are
+    skipped rather than raised.
+    """
+    bundles: list[str] = []
+    subdirs: list[str] = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    # Never descend into a bundle: its Contents/ tree holds
+                    # hundreds of entries and any .app found there is nested.
+                    if entry.name.endswith(".app") and entry.is_dir():
+                        bundles.append(entry.path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return bundles, subdirs
+
+
+def _walk_parallel(directories: list[str]) -> Iterator[str]:
+    """Walk directories on a pool of threads sharing one work queue.
+
+    Bundles are yielded as the workers find them, while the walk is still running.
+    """
+    pending: queue.Queue[str | None] = queue.Queue()
+    hits: queue.Queue[str | None] = queue.Queue()
+
+    def worker() -> None:
+        while True:
+            directory = pending.get()
+            if directory is None:
+                return
+            try:
+                bundles, subdirs = _scan_dir(directory)
+                for bundle in bundles:
+                    hits.put(bundle)
+                for subdir in subdirs:
+                    pending.put(subdir)
+            except Exception:
+                # A dead worker would leave pending undrained and hang the
+                # walk, so skip the directory and keep going.
+                pass
+            finally:
+                pending.task_done()
+
+    def finish() -> None:
+        pending.join()
+        for _ in threads:
+            pending.put(None)
+        hits.put(None)
+
+    for directory in directories:
+        pending.put(directory)
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(WALK_WORKERS)]
+    for thread in threads:
+        thread.start()
+    threading.Thread(target=finish, daemon=True).start()
+    while (hit := hits.get()) is not None:
+        yield hit
+
+
+def _iter_app_bundles(root: Path) -> Iterator[str]:
     """Yield top-level .app bundles under root (skip nested bundles)."""
-    bundles: list[Path] = []
-    for path in root.rglob("*.app"):
-        if any(parent.suffix == ".app" for parent in path.parents):
-            continue
-        bundles.append(path)
-    return bundles
+    bundles, subdirs = _scan_dir(str(root))
+    yield from bundles
+    if len(subdirs) > PARALLEL_WALK_MIN_SUBDIRS:
+        # Hide per-directory latency (e.g. ~/Applications on a network share)
+        # behind several scanners; small trees are not worth the threads.
+        yield from _walk_parallel(subdirs)
+        return
+    stack = subdirs
+    while stack:
+        bundles, subdirs = _scan_dir(stack.pop())
+        yield from bundles
+        stack.extend(subdirs)
+
+
+def _parse_date_added(value: str) -> datetime.datetime | None:
+    """Parse a raw kMDItemDateAdded value, returning None when it is missing."""
+    value = value.strip()
+    if not value or value == MDLS_NULL_MARKER:
+        return None
+    try:
+        return _parse_mdls_timestamp(value)
+    except ValueError:
+        return None
+
 
+def _parse_mdls_timestamp(value: str) -> datetime.datetime:
+    """Parse "%Y-%m-%d %H:%M:%S %z" by slicing, falling back to strptime."""
+    if (
+        len(value) != 25
+        or value[4] != "-"
+        or value[7] != "-"
+        or value[10] != " "
+        or value[13] != ":"
+        or value[16] != ":"
+        or value[19] != " "
+        or value[20] not in "+-"
+    ):
+        return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S %z")
+    suffix = value[20:]
+    tz = _OFFSETS.get(suffix)
+    if tz is None:
+        offset = datetime.timedelta(hours=int(value[21:23]), minutes=int(value[23:25]))
+        tz = _OFFSETS.setdefault(
+            suffix, datetime.timezone(-offset if value[20] == "-" else offset)
+        )
+    return datetime.datetime(
+        int(value[0:4]),
+        int(value[5:7]),
+        int(value[8:10]),
+        int(value[11:13]),
+        int(value[14:16]),
+        int(value[17:19]),
+        tzinfo=tz,
+    )
 
-def _get_date_added(app_path: Path) -> datetime.datetime | None:
-    """Fetch Spotlight date-added metadata for an app bundle."""
+
+def _get_dates_added_mdls(paths: list[str]) -> dict[str, datetime.datetime]:
+    """Fetch date-added metadata for many app bundles with one mdls call."""
+    if not paths:
+        return {}
     proc = subprocess.run(
-        ["mdls", "-name", "kMDItemDateAdded", "-raw", str(app_path)],
+        [
+            "mdls",
+            "-name",
+            "kMDItemDateAdded",
+            "-raw",
+            "-nullMarker",
+            MDLS_NULL_MARKER,
+            *paths,
+        ],
         capture_output=True,
-        text=True,
     )
-    if proc.returncode != 0:
+    # mdls -raw separates the records for multiple files with a NUL byte.
+    records = proc.stdout.split(b"\0")
+    if len(records) != len(paths):
+        # A path that vanished or could not be read drops its record, so the
+        # output can no longer be matched up; retry the paths one at a time.
+        if len(paths) == 1:
+            return {}
+        dates: dict[str, datetime.datetime] = {}
+        for app_path in paths:
+            dates.update(_get_dates_added_mdls([app_path]))
+        return dates
+    dates = {}
+    for app_path, record in zip(paths, records):
+        added = _parse_date_added(record.decode("utf-8", errors="replace"))
+        if added is not None:
+            dates[app_path] = added
+    return dates
+
+
+class _CoreServices(NamedTuple):
+    cf: ctypes.CDLL
+    cs: ctypes.CDLL
+    date_added_attr: int
+
+
+@functools.cache
+def _core_services() -> _CoreServices | None:
+    """Load the Spotlight metadata C API, or return None where it is unavailable."""
+    if sys.platform != "darwin":
         return None
-    date_str = proc.stdout.strip()
-    if not date_str or date_str == "(null)":
+    try:
+        cf = ctypes.CDLL(CORE_FOUNDATION_PATH)
+        cs = ctypes.CDLL(CORE_SERVICES_PATH)
+    except OSError:
+        return None
+    cf.CFStringCreateWithCString.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_uint32]
+    cf.CFStringCreateWithCString.restype = ctypes.c_void_p
+    cf.CFGetTypeID.argtypes = [ctypes.c_void_p]
+    cf.CFGetTypeID.restype = ctypes.c_ulong
+    cf.CFDateGetTypeID.argtypes = []
+    cf.CFDateGetTypeID.restype = ctypes.c_ulong
+    cf.CFDateGetAbsoluteTime.argtypes = [ctypes.c_void_p]
+    cf.CFDateGetAbsoluteTime.restype = ctypes.c_double
+    cf.CFRelease.argtypes = [ctypes.c_void_p]
+    cf.CFRelease.restype = None
+    cs.MDItemCreate.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    cs.MDItemCreate.restype = ctypes.c_void_p
+    cs.MDItemCopyAttribute.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    cs.MDItemCopyAttribute.restype = ctypes.c_void_p
+    attr = cf.CFStringCreateWithCString(None, b"kMDItemDateAdded", K_CF_STRING_ENCODING_UTF8)
+    if not attr:
+        return None
+    return _CoreServices(cf, cs, attr)
+
+
+def _get_date_added_native(api: _CoreServices, app_path: str) -> datetime.datetime | None:
+    """Read kMDItemDateAdded through MDItemCopyAttribute instead of spawning mdls."""
+    cf = api.cf
+    cf_path = cf.CFStringCreateWithCString(
+        None, os.fsencode(app_path), K_CF_STRING_ENCODING_UTF8
+    )
+    if not cf_path:
         return None
     try:
-        added = datetime.datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S %z")
-    except ValueError:
+        item = api.cs.MDItemCreate(None, cf_path)
+    finally:
+        cf.CFRelease(cf_path)
+    if not item:
+        return None
+    try:
+        value = api.cs.MDItemCopyAttribute(item, api.date_added_attr)
+    finally:
+        cf.CFRelease(item)
+    if not value:
         return None
-    return added
+    try:
+        if cf.CFGetTypeID(value) != cf.CFDateGetTypeID():
+            return None
+        seconds = cf.CFDateGetAbsoluteTime(value)
+    finally:
+        cf.CFRelease(value)
+    return datetime.datetime.fromtimestamp(
+        seconds + CF_ABSOLUTE_TIME_EPOCH, tz=datetime.timezone.utc
+    )
 
 
-def gather_latest_installs(days: int) -> list[tuple[datetime.datetime, Path]]:
-    """Return (date_added, app_path) tuples sorted newest first."""
-    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
-    results: list[tuple[datetime.datetime, Path]] = []
-    for root in ROOTS:
-        if not root.exists():
+def _get_dates_added_bulk(paths: list[str]) -> dict[str, datetime.datetime]:
+    """Fetch Spotlight date-added metadata for many app bundles."""
+    api = _core_services()
+    if api is None:
+        return _get_dates_added_mdls(paths)
+    dates: dict[str, datetime.datetime] = {}
+    for app_path in paths:
+        added = _get_date_added_native(api, app_path)
+        if added is not None:
+            dates[app_path] = added
+    return dates
+
+
+def _remember_date_added(key: tuple[int, int, int], added: datetime.datetime) -> None:
+    """Keep a date in the in-process memo, evicting the oldest entry when full."""
+    memo_key = (CACHE_NONCE, *key)
+    if memo_key not in _date_added_memo and len(_date_added_memo) >= MEMO_SIZE:
+        del _date_added_memo[next(iter(_date_added_memo))]
+    _date_added_memo[memo_key] = added
+
+
+def _open_cache() -> sqlite3.Connection | None:
+    """Open the date-added cache, or return None if it cannot be used."""
+    try:
+        conn = sqlite3.connect(CACHE_FILE, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != CACHE_NONCE:
+            conn.execute("DROP TABLE IF EXISTS meta")
+            conn.execute(f"PRAGMA user_version={CACHE_NONCE:d}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta("
+            "dev INTEGER, ino INTEGER, ctime_ns INTEGER, date_added TEXT, "
+            "PRIMARY KEY(dev, ino))"
+        )
+    except sqlite3.Error:
+        return None
+    return conn
+
+
+def _cached_date_added(
+    conn: sqlite3.Connection, key: tuple[int, int, int]
+) -> datetime.datetime | None:
+    """Look up a bundle's date added by (st_dev, st_ino, st_ctime_ns)."""
+    try:
+        row = conn.execute(
+            "SELECT date_added FROM meta WHERE dev=? AND ino=? AND ctime_ns=?", key
+        ).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+    return datetime.datetime.fromisoformat(row[0])
+
+
+def _store_dates_added(
+    conn: sqlite3.Connection, rows: list[tuple[tuple[int, int, int], datetime.datetime]]
+) -> None:
+    """Record freshly probed dates so later runs can skip mdls for them."""
+    try:
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta(dev, ino, ctime_ns, date_added) VALUES (?, ?, ?, ?)",
+            [(*key, added.isoformat()) for key, added in rows],
+        )
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def _find_recent_bundles(roots: list[Path], days: int) -> list[str] | None:
+    """Ask the Spotlight index for bundles added recently, or None if it is unavailable."""
+    if not roots:
+        return []
+    query = (
+        'kMDItemContentType == "com.apple.application-bundle"'
+        f" && kMDItemDateAdded >= $time.today(-{days})"
+    )
+    args = ["mdfind"]
+    for root in roots:
+        args += ["-onlyin", str(root)]
+    args.append(query)
+    try:
+        proc = subprocess.run(args, capture_output=True, text=True)
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    bundles: list[str] = []
+    for line in proc.stdout.splitlines():
+        if not line:
+            continue
+        # Spotlight also indexes helper apps inside other bundles.
+        if ".app/" in os.path.dirname(line) + "/":
             continue
-        for app_path in _iter_app_bundles(root):
-            added = _get_date_added(app_path)
-            if added is None:
-                continue
-            if added.astimezone(datetime.timezone.utc) < cutoff:
-                continue
-            results.append((added, app_path))
+        bundles.append(line)
+    return bundles
+
+
+def gather_latest_installs(
+    days: int, use_index: bool = True
+) -> list[tuple[datetime.datetime, str]]:
+    """Return (date_added, app_path) tuples sorted newest first.
+
+    Candidates come from a single mdfind query unless use_index is False or
+    Spotlight cannot be queried, in which case ROOTS are walked instead.
+    """
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    cutoff_posix = cutoff.timestamp()
+    found: list[tuple[datetime.datetime, str]] = []
+    pending: list[str] = []
+    futures: list[Future[dict[str, datetime.datetime]]] = []
+    keys: dict[str, tuple[int, int, int]] = {}
+    seen: set[str] = set()
+    roots = [root for root in ROOTS if root.exists()]
+    bundles: Iterable[str] | None = _find_recent_bundles(roots, days) if use_index else None
+    if bundles is None:
+        bundles = itertools.chain.from_iterable(_iter_app_bundles(root) for root in roots)
+    conn = _open_cache()
+    try:
+        # Batches spend their time in Spotlight queries or waiting on mdls child
+        # processes, both of which release the GIL. Each batch is submitted as
+        # soon as it fills, so probing overlaps with the rest of the walk.
+        with ThreadPoolExecutor(max_workers=MAX_PROBE_WORKERS) as executor:
+            for app_path in bundles:
+                # /Applications/Utilities sits under /Applications, so drop repeat hits.
+                if app_path in seen:
+                    continue
+                seen.add(app_path)
+                try:
+                    st = os.stat(app_path)
+                except OSError:
+                    continue
+                # Copying or moving a bundle into place changes its inode, so the
+                # status-change time is never older than the date added. Birth and
+                # modification times survive a Finder copy and cannot bound it.
+                if st.st_ctime < cutoff_posix:
+                    continue
+                # A move keeps the inode and mtime but resets the date added; it
+                # does update ctime, which also changes whenever mtime does.
+                key = keys[app_path] = (st.st_dev, st.st_ino, st.st_ctime_ns)
+                added = _date_added_memo.get((CACHE_NONCE, *key))
+                if added is None and conn is not None:
+                    added = _cached_date_added(conn, key)
+                    if added is not None:
+                        _remember_date_added(key, added)
+                if added is not None:
+                    found.append((added, app_path))
+                    continue
+                pending.append(app_path)
+                if len(pending) == MDLS_BATCH_SIZE:
+                    futures.append(executor.submit(_get_dates_added_bulk, pending))
+                    pending = []
+            if pending:
+                futures.append(executor.submit(_get_dates_added_bulk, pending))
+            for future in futures:
+                dates = future.result()
+                for app_path, added in dates.items():
+                    found.append((added, app_path))
+                    _remember_date_added(keys[app_path], added)
+                if conn is not None:
+                    _store_dates_added(
+                        conn, [(keys[app_path], added) for app_path, added in dates.items()]
+                    )
+    finally:
+        if conn is not None:
+            conn.close()
+
+    results = [
+        (added, app_path)
+        for added, app_path in found
+        if added.astimezone(datetime.timezone.utc) >= cutoff
+    ]
     results.sort(key=lambda item: item[0], reverse=True)
     return results
 
 
-def build_report(entries: list[tuple[datetime.datetime, Path]], days: int) -> list[str]:
+def build_report(entries: list[tuple[datetime.datetime, str]], days: int) -> list[str]:
     """Format entries into human-readable report lines."""
     if not entries:
         return [f"No applications found with date-added within the last {days} days."]
     local_tz = datetime.datetime.now().astimezone().tzinfo
+    # astimezone() yields a fixed-offset zone, so its name is the same for
+    # every entry and the fields can be formatted without strftime.
+    tz_name = local_tz.tzname(None)
     lines = []
     for added, app_path in entries:
-        local_added = added.astimezone(local_tz)
-        timestamp = local_added.strftime("%Y-%m-%d %H:%M:%S %Z")
-        lines.append(f"{timestamp} - {app_path.name} ({app_path})")
+        local = added.astimezone(local_tz)
+        lines.append(
+            f"{local.year:04d}-{local.month:02d}-{local.day:02d} "
+            f"{local.hour:02d}:{local.minute:02d}:{local.second:02d} {tz_name}"
+            f" - {os.path.basename(app_path)} ({app_path})"
+        )
     return lines
 
 
 def write_report(lines: list[str]) -> None:
-    OUTPUT_FILE.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    data = "".join(f"{line}\n" for line in lines).encode("utf-8")
+    fd = os.open(OUTPUT_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view) :]
+    finally:
+        os.close(fd)
 
 
 def parse_args(argv: list[str]) -> argparse.Namespace:
@@ -96,6 +494,11 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
         default=DEFAULT_LOOKBACK_DAYS,
         help=f"Number of days to look back (default: {DEFAULT_LOOKBACK_DAYS}).",
     )
+    parser.add_argument(
+        "--walk",
+        action="store_true",
+        help="Walk the application folders instead of querying the Spotlight index.",
+    )
     return parser.parse_args(argv)
 
 
@@ -104,7 +507,7 @@ def main(argv: list[str] | None = None) -> int:
     if args.days <= 0:
         print("Days must be a positive integer.", file=sys.stderr)
         return 1
-    entries = gather_latest_installs(args.days)
+    entries = gather_latest_installs(args.days, use_index=not args.walk)
     report_lines = build_report(entries, args.days)
     print("\n".join(report_lines))
     try: